@@ -11,9 +11,13 @@
 版本: 1.0.2
 """
 
+import asyncio
 import random
+import re
 import time
-from typing import List, Tuple, Type, Optional, Dict, Any
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import List, Tuple, Type, Optional, Dict, Any, Callable
 
 from src.plugin_system import (
     BasePlugin,
@@ -31,31 +35,228 @@ logger = get_logger("ProactivePrivateChat")
 # 默认平台
 DEFAULT_PLATFORM = "qq"
 
+# 命令正则，模块加载时编译一次
+_PRIVATE_CHAT_RE = re.compile(r"^[/／]私聊\s+(?P<target_id>\d+)(?:\s+(?P<message>.+))?$")
+_LIST_RE = re.compile(r"^[/／]私聊列表$")
+# 纯数字用户ID
+_DIGITS_RE = re.compile(r"\A\d+\Z")
+
 
 # ==================== 工具函数 ====================
 
 class PrivateChatCooldown:
-    """私聊冷却时间管理器"""
+    """私聊冷却时间管理器
+    
+    使用 OrderedDict 作为有界 LRU，记录发送时顺带清理已过期的条目，避免长期运行时无限增长。
+    """
     
-    _cooldowns: Dict[str, float] = {}
+    MAX_ENTRIES = 10000
+    
+    _cooldowns: "OrderedDict[str, float]" = OrderedDict()
+    
+    @classmethod
+    def check_and_remaining(cls, user_id: str, cooldown_seconds: int) -> Tuple[bool, int]:
+        """检查是否可以发送并返回剩余冷却时间（秒），只读取一次时钟"""
+        last_time = cls._cooldowns.get(user_id)
+        if last_time is None:
+            return True, 0
+        cls._cooldowns.move_to_end(user_id)
+        remaining = cooldown_seconds - (time.monotonic() - last_time)
+        if remaining <= 0:
+            return True, 0
+        return False, int(remaining)
     
     @classmethod
     def can_send(cls, user_id: str, cooldown_seconds: int) -> bool:
         """检查是否可以向指定用户发送私聊"""
-        last_time = cls._cooldowns.get(user_id, 0)
-        return time.time() - last_time >= cooldown_seconds
+        return cls.check_and_remaining(user_id, cooldown_seconds)[0]
     
     @classmethod
-    def record_send(cls, user_id: str):
-        """记录向指定用户发送私聊的时间"""
-        cls._cooldowns[user_id] = time.time()
+    def record_send(cls, user_id: str, cooldown_seconds: Optional[int] = None):
+        """记录向指定用户发送私聊的时间，并清理最旧端已过期的条目
+        
+        未提供有效的 cooldown_seconds 时无法判断其他条目是否过期，只按容量淘汰。
+        """
+        sweep_expired = cooldown_seconds is not None and cooldown_seconds > 0
+        now = time.monotonic()
+        cls._cooldowns.pop(user_id, None)
+        cls._cooldowns[user_id] = now
+        
+        # 从最旧端惰性清理：已过期的直接移除，超出容量时强制淘汰
+        while cls._cooldowns:
+            oldest_id, oldest_time = next(iter(cls._cooldowns.items()))
+            if oldest_id == user_id:
+                break
+            if len(cls._cooldowns) > cls.MAX_ENTRIES or (sweep_expired and now - oldest_time > cooldown_seconds):
+                cls._cooldowns.popitem(last=False)
+            else:
+                break
     
     @classmethod
     def get_remaining_time(cls, user_id: str, cooldown_seconds: int) -> int:
         """获取剩余冷却时间（秒）"""
-        last_time = cls._cooldowns.get(user_id, 0)
-        remaining = cooldown_seconds - (time.time() - last_time)
-        return max(0, int(remaining))
+        return cls.check_and_remaining(user_id, cooldown_seconds)[1]
+
+
+class _GlobalTokenBucket:
+    """全局令牌桶限流器，限制所有用户合计的私聊发送速率"""
+    
+    rate_per_s: float = 1.0
+    burst: int = 5
+    
+    tokens: float = float(burst)
+    last_refill: float = time.monotonic()
+    
+    @classmethod
+    def acquire(cls) -> bool:
+        """尝试获取一个发送令牌"""
+        now = time.monotonic()
+        cls.tokens = min(cls.burst, cls.tokens + (now - cls.last_refill) * cls.rate_per_s)
+        cls.last_refill = now
+        if cls.tokens >= 1:
+            cls.tokens -= 1
+            return True
+        return False
+
+
+# ==================== 用户信息缓存 ====================
+
+# 用户信息缓存有效期（秒）与最大条目数
+PERSON_CACHE_TTL = 3600
+PERSON_CACHE_MAX_ENTRIES = 10000
+# "未找到" 结果的缓存有效期（秒）
+USERNAME_NEGATIVE_TTL = 60
+KNOWN_USER_NEGATIVE_TTL = 30
+PERSON_VALUE_NEGATIVE_TTL = 60
+
+# 用户信息查询中预期可能出现的异常，其余异常交由外层统一处理
+_LOOKUP_ERRORS = (KeyError, AttributeError, TypeError, ValueError, ConnectionError)
+
+# (platform, user_id) -> (person_id, 写入时间)
+_person_id_cache: Dict[Tuple[str, str], Tuple[str, float]] = {}
+# (person_id, field) -> (value, 写入时间)
+_person_value_cache: Dict[Tuple[str, str], Tuple[Any, float]] = {}
+# (platform, username) -> (user_id, 写入时间)
+_username_to_userid_cache: Dict[Tuple[str, str], Tuple[Optional[str], float]] = {}
+# (platform, user_id) -> (是否已知用户, 写入时间)
+_known_user_cache: Dict[Tuple[str, str], Tuple[bool, float]] = {}
+# 每个键一把锁及其使用者数量，合并同一用户的并发未命中查询
+_person_value_locks: Dict[Tuple[str, str], List[Any]] = {}
+
+
+def _cache_get(cache: Dict, key: Tuple, ttl: float, negative_ttl: Optional[float] = None) -> Tuple[bool, Any]:
+    """读取带TTL的缓存，返回 (是否命中, 值)；指定 negative_ttl 时空结果使用该有效期"""
+    entry = cache.get(key)
+    if entry is None:
+        return False, None
+    if negative_ttl is not None and not entry[0]:
+        ttl = negative_ttl
+    if time.monotonic() - entry[1] < ttl:
+        return True, entry[0]
+    return False, None
+
+
+def _cache_put(cache: Dict, key: Tuple, value: Any, max_entries: int = PERSON_CACHE_MAX_ENTRIES):
+    """写入缓存，超出容量时按插入顺序淘汰最旧的条目"""
+    cache.pop(key, None)
+    cache[key] = (value, time.monotonic())
+    while len(cache) > max_entries:
+        cache.pop(next(iter(cache)))
+
+
+def _cached_get_person_id(platform: str, user_id: str) -> Optional[str]:
+    """带缓存的 person_api.get_person_id，仅在未命中时才将user_id转换为整数"""
+    key = (platform, str(user_id))
+    hit, person_id = _cache_get(_person_id_cache, key, PERSON_CACHE_TTL)
+    if hit:
+        return person_id
+    
+    person_id = person_api.get_person_id(platform, int(user_id))
+    if person_id:
+        _cache_put(_person_id_cache, key, person_id)
+    return person_id
+
+
+async def _cached_get_person_value(person_id: Optional[str], field_name: str, default: Any = None) -> Any:
+    """带缓存的 person_api.get_person_value，同一键的并发未命中只会查询一次"""
+    if not person_id:
+        return default
+    
+    key = (person_id, field_name)
+    hit, value = _cache_get(_person_value_cache, key, PERSON_CACHE_TTL, PERSON_VALUE_NEGATIVE_TTL)
+    if hit:
+        return default if value is None else value
+    
+    lock_entry = _person_value_locks.get(key)
+    if lock_entry is None:
+        lock_entry = _person_value_locks[key] = [asyncio.Lock(), 0]
+    lock_entry[1] += 1
+    try:
+        async with lock_entry[0]:
+            # 等锁期间可能已被其他协程填充
+            hit, value = _cache_get(_person_value_cache, key, PERSON_CACHE_TTL, PERSON_VALUE_NEGATIVE_TTL)
+            if not hit:
+                value = await person_api.get_person_value(person_id, field_name)
+                _cache_put(_person_value_cache, key, value)
+    finally:
+        # 最后一个使用者离开时才移除锁，等待中的协程仍共用同一把锁
+        lock_entry[1] -= 1
+        if lock_entry[1] == 0 and _person_value_locks.get(key) is lock_entry:
+            del _person_value_locks[key]
+    
+    return default if value is None else value
+
+
+# ==================== 私聊流缓存 ====================
+
+STREAM_CACHE_TTL = 300
+STREAM_CACHE_MAX_ENTRIES = 1024
+
+# (platform, user_id) -> (chat_stream, 写入时间)
+_stream_cache: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+
+
+async def _get_stream_cached(user_id: str, platform: str) -> Any:
+    """带缓存的 chat_api.get_stream_by_user_id，只缓存找到的私聊流，未命中时在线程中查询"""
+    key = (platform, str(user_id))
+    entry = _stream_cache.get(key)
+    if entry is not None and time.monotonic() - entry[1] < STREAM_CACHE_TTL:
+        _stream_cache.move_to_end(key)
+        return entry[0]
+    
+    chat_stream = await asyncio.to_thread(chat_api.get_stream_by_user_id, user_id, platform)
+    if chat_stream is None:
+        _stream_cache.pop(key, None)
+        return None
+    
+    _put_stream_cache(user_id, platform, chat_stream)
+    return chat_stream
+
+
+def _put_stream_cache(user_id: str, platform: str, chat_stream: Any):
+    """写入私聊流缓存，超出容量时淘汰最久未用的条目"""
+    key = (platform, str(user_id))
+    _stream_cache[key] = (chat_stream, time.monotonic())
+    _stream_cache.move_to_end(key)
+    while len(_stream_cache) > STREAM_CACHE_MAX_ENTRIES:
+        _stream_cache.popitem(last=False)
+
+
+def _invalidate_stream_cache(user_id: str, platform: str):
+    """移除缓存的私聊流，用于发送失败后重新获取"""
+    _stream_cache.pop((platform, str(user_id)), None)
+
+
+async def _get_stream_infos(streams: List[Any]) -> List[Dict[str, Any]]:
+    """获取多个私聊流的信息，优先使用批量接口，否则并发逐个获取"""
+    get_stream_infos = getattr(chat_api, "get_stream_infos", None)
+    if get_stream_infos is not None:
+        return list(await asyncio.to_thread(get_stream_infos, streams))
+    
+    return list(await asyncio.gather(
+        *(asyncio.to_thread(chat_api.get_stream_info, stream) for stream in streams)
+    ))
+
 
 async def get_user_id_by_name(platform: str, username: str) -> Optional[str]:
     """
@@ -66,65 +267,293 @@ async def get_user_id_by_name(platform: str, username: str) -> Optional[str]:
     Returns:
         对应的用户ID（数字字符串），未找到则返回None
     """
+    cache_key = (platform, username)
+    hit, cached_user_id = _cache_get(
+        _username_to_userid_cache, cache_key, PERSON_CACHE_TTL, USERNAME_NEGATIVE_TTL
+    )
+    if hit:
+        return cached_user_id
+    
     try:
         # 1. 先通过用户名获取person_id（使用提供的get_person_id_by_name）
-        person_id = person_api.get_person_id_by_name(username)
+        person_id = await asyncio.to_thread(person_api.get_person_id_by_name, username)
         if not person_id:
             logger.debug(f"未找到用户名 {username} 对应的person_id")
+            _cache_put(_username_to_userid_cache, cache_key, None)
             return None
         
         # 2. 通过person_id获取对应的user_id（使用现有get_person_value方法）
         # 假设user_id存储在person的"user_id"属性中，若实际字段名不同需调整
-        user_id = await person_api.get_person_value(person_id, "user_id")
+        # 同时预取昵称，后续发送私聊时可直接命中缓存
+        user_id, nickname = await asyncio.gather(
+            person_api.get_person_value(person_id, "user_id"),
+            person_api.get_person_value(person_id, "nickname"),
+            return_exceptions=True,
+        )
+        if isinstance(user_id, BaseException):
+            raise user_id
+        _cache_put(_person_value_cache, (person_id, "user_id"), user_id)
+        # 昵称只是顺带预取，获取失败或为空时不影响用户名解析
+        if nickname is not None and not isinstance(nickname, BaseException):
+            _cache_put(_person_value_cache, (person_id, "nickname"), nickname)
         
         if user_id is not None:
-            return str(user_id)  # 确保返回字符串类型的数字ID
+            user_id = str(user_id)  # 确保返回字符串类型的数字ID
+            _cache_put(_username_to_userid_cache, cache_key, user_id)
+            _cache_put(_person_id_cache, (platform, user_id), person_id)
+            return user_id
         else:
             logger.debug(f"用户 {username} 的person_id {person_id} 未关联user_id属性")
+            _cache_put(_username_to_userid_cache, cache_key, None)
             return None
             
-    except Exception as e:
+    except _LOOKUP_ERRORS as e:
         logger.error(f"通过用户名查询用户ID失败: {e}")
         return None
 
-async def is_user_known(platform: str, user_id: str) -> bool:
-    """
-    判断用户是否是已知用户
-    判定逻辑：
-    1. 优先通过person_api获取person_id判断
-    2. 若获取失败，检查是否存在该用户的私聊流（存在则视为已知）
-    """
+
+async def _probe_person_id(platform: str, user_id: str) -> bool:
+    """检查用户是否有person_id"""
     try:
-        # 原逻辑：检查是否有person_id
-        person_id = person_api.get_person_id(platform, int(user_id))
-        if person_id:
-            return True
-    except Exception as e:
+        # 在事件循环中调用，缓存只由事件循环读写
+        person_id = _cached_get_person_id(platform, user_id)
+        return bool(person_id)
+    except _LOOKUP_ERRORS as e:
         logger.debug(f"通过person_api检查用户 {user_id} 失败: {e}")
-    
+        return False
+
+
+async def _probe_private_stream(platform: str, user_id: str) -> bool:
+    """检查是否存在该用户的私聊流"""
     try:
-        # 新增逻辑：检查是否存在私聊流
-        chat_stream = chat_api.get_stream_by_user_id(user_id, platform)
+        chat_stream = await _get_stream_cached(user_id, platform)
         if chat_stream is not None:
             logger.debug(f"用户 {user_id} 存在私聊流，视为已知用户")
             return True
-    except Exception as e:
+    except _LOOKUP_ERRORS as e:
         logger.debug(f"检查用户 {user_id} 私聊流失败: {e}")
+    return False
+
+
+async def is_user_known(platform: str, user_id: str) -> bool:
+    """
+    判断用户是否是已知用户
+    判定逻辑（两项检查并发进行，任一成立即返回）：
+    1. 通过person_api获取person_id判断
+    2. 检查是否存在该用户的私聊流（存在则视为已知）
+    """
+    cache_key = (platform, str(user_id))
+    hit, known = _cache_get(_known_user_cache, cache_key, PERSON_CACHE_TTL, KNOWN_USER_NEGATIVE_TTL)
+    if hit:
+        return known
+    
+    pending = {
+        asyncio.create_task(_probe_person_id(platform, user_id)),
+        asyncio.create_task(_probe_private_stream(platform, user_id)),
+    }
+    probe_failed = False
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                # 单项检查出错视为未通过，继续等待另一项检查
+                error = task.exception()
+                if error is not None:
+                    logger.debug(f"检查用户 {user_id} 是否已知时出错: {error}")
+                    probe_failed = True
+                elif task.result():
+                    _cache_put(_known_user_cache, cache_key, True)
+                    return True
+    finally:
+        for task in pending:
+            task.cancel()
     
+    # 检查出错时结果不可信，不写入否定缓存
+    if not probe_failed:
+        _cache_put(_known_user_cache, cache_key, False)
     return False
 
 
+# 预热时最多处理的私聊流数量
+PREWARM_MAX_STREAMS = 100
+
+
+async def prewarm_user_caches(platform: str = DEFAULT_PLATFORM):
+    """用最近的私聊对象预热私聊流、已知用户和昵称缓存"""
+    private_streams = await asyncio.to_thread(chat_api.get_private_streams, platform)
+    if not private_streams:
+        return
+    
+    private_streams = private_streams[:PREWARM_MAX_STREAMS]
+    stream_infos = await _get_stream_infos(private_streams)
+    
+    nickname_fetches = []
+    for chat_stream, info in zip(private_streams, stream_infos):
+        user_id = info.get("user_id")
+        if not user_id:
+            continue
+        user_id = str(user_id)
+        
+        # 存在私聊流即视为已知用户
+        _put_stream_cache(user_id, platform, chat_stream)
+        _cache_put(_known_user_cache, (platform, user_id), True)
+        
+        # 与其他调用处一致，在事件循环中查询person_id
+        try:
+            person_id = _cached_get_person_id(platform, user_id)
+        except _LOOKUP_ERRORS as e:
+            logger.debug(f"预热用户 {user_id} 的person_id失败: {e}")
+            continue
+        if person_id:
+            nickname_fetches.append(_cached_get_person_value(person_id, "nickname"))
+    
+    results = await asyncio.gather(*nickname_fetches, return_exceptions=True)
+    warmed = sum(1 for result in results if result is not None and not isinstance(result, BaseException))
+    logger.info(f"已预热 {warmed}/{len(nickname_fetches)} 个私聊用户的昵称缓存")
+
+
+# ==================== 配置快照 ====================
+
+# 配置快照有效期（秒），过期后重新读取以感知配置重载
+CONFIG_SNAPSHOT_TTL = 30
+
+
+@dataclass(slots=True, frozen=True)
+class _Snap:
+    """热路径上使用的配置快照"""
+    
+    enabled: bool
+    cooldown_seconds: int
+    only_known_users: bool
+    random_greetings: Tuple[str, ...]
+    default_greeting: str
+    allowed_platforms: frozenset
+    
+    # 问候语候选列表及累积权重，随快照一起构建
+    _greet_population: Tuple[str, ...] = field(init=False, repr=False, compare=False)
+    _greet_cum_weights: Tuple[float, ...] = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        population, cum_weights = _build_greeting_table(self.random_greetings, self.default_greeting)
+        object.__setattr__(self, "_greet_population", population)
+        object.__setattr__(self, "_greet_cum_weights", cum_weights)
+    
+    @classmethod
+    def from_config(cls, config_getter) -> "_Snap":
+        """从配置中读取所有热路径配置项"""
+        return cls(
+            enabled=config_getter("general.enabled", True),
+            cooldown_seconds=config_getter("general.cooldown_seconds", 300),
+            only_known_users=config_getter("smart_chat.only_known_users", True),
+            random_greetings=tuple(config_getter("messages.random_greetings", [])),
+            default_greeting=config_getter("messages.default_greeting", "嗨 {nickname}，最近怎么样呀？"),
+            allowed_platforms=frozenset(config_getter("general.allowed_platforms", [DEFAULT_PLATFORM])),
+        )
+
+
+_config_snapshot: Optional[_Snap] = None
+_config_version: float = 0.0
+
+
+def get_config_snapshot(config_getter) -> _Snap:
+    """获取配置快照，同一版本内只读取一次配置"""
+    global _config_snapshot, _config_version
+    now = time.monotonic()
+    if _config_snapshot is None or now - _config_version >= CONFIG_SNAPSHOT_TTL:
+        _config_snapshot = _Snap.from_config(config_getter)
+        _config_version = now
+    return _config_snapshot
+
+
+def invalidate_config_snapshot():
+    """丢弃配置快照，下次访问时重新读取"""
+    global _config_snapshot
+    _config_snapshot = None
+
+
+# ==================== 消息模板 ====================
+
+TEMPLATE_CACHE_MAX_ENTRIES = 256
+
+# 模板字符串 -> 渲染函数
+_compiled_template_cache: Dict[str, Callable[[str], str]] = {}
+
+
+def _compile_template(tmpl: str) -> Callable[[str], str]:
+    """将模板按 {nickname} 预先切分，渲染时只需一次 join，结果与 str.replace 一致"""
+    # 快速路径：不含变量的模板直接返回原文
+    if "{nickname}" not in tmpl:
+        return lambda _: tmpl
+    
+    parts = tmpl.split("{nickname}")
+    return lambda nickname: nickname.join(parts)
+
+
+def render_template(tmpl: str, nickname: str) -> str:
+    """使用缓存的渲染函数替换 {nickname}，仅用于配置中的问候模板"""
+    render = _compiled_template_cache.get(tmpl)
+    if render is None:
+        render = _compile_template(tmpl)
+        if len(_compiled_template_cache) >= TEMPLATE_CACHE_MAX_ENTRIES:
+            _compiled_template_cache.pop(next(iter(_compiled_template_cache)))
+        _compiled_template_cache[tmpl] = render
+    return render(str(nickname))
+
+
+def fill_nickname(text: str, nickname: str) -> str:
+    """替换自由文本（用户或模型给出的消息）中的 {nickname}，不做其他解析"""
+    return text.replace("{nickname}", str(nickname))
+
+
+# 插件独立的随机数生成器
+_rng = random.Random()
+
+# 选中默认问候语的概率
+DEFAULT_GREETING_WEIGHT = 0.3
+
+
+def _build_greeting_table(random_greetings: Tuple[str, ...], default: str) -> Tuple[Tuple[str, ...], Tuple[float, ...]]:
+    """构建问候语候选列表及累积权重"""
+    if not random_greetings:
+        return (default,), (1.0,)
+    
+    per_greeting = (1 - DEFAULT_GREETING_WEIGHT) / len(random_greetings)
+    population = (default,) + random_greetings
+    cum_weights = tuple(
+        DEFAULT_GREETING_WEIGHT + per_greeting * i for i in range(len(population))
+    )
+    return population, cum_weights
+
+
 async def get_greeting_message(config_getter, nickname: str) -> str:
     """获取问候消息"""
-    # 尝试从随机问候列表中选择
-    random_greetings = config_getter("messages.random_greetings", [])
-    if random_greetings and random.random() > 0.3:
-        message = random.choice(random_greetings)
-    else:
-        message = config_getter("messages.default_greeting", "嗨 {nickname}，最近怎么样呀？")
+    snap = get_config_snapshot(config_getter)
+    message = _rng.choices(snap._greet_population, cum_weights=snap._greet_cum_weights, k=1)[0]
     
     # 替换变量
-    return message.replace("{nickname}", nickname)
+    return render_template(message, nickname)
+
+
+USER_LOCK_MAX_ENTRIES = 1024
+
+# user_id -> 发送锁
+_user_locks: "OrderedDict[str, asyncio.Lock]" = OrderedDict()
+
+
+def _get_user_lock(user_id: str) -> asyncio.Lock:
+    """获取指定用户的发送锁，超出容量时淘汰最久未用且未被占用的锁"""
+    lock = _user_locks.get(user_id)
+    if lock is None:
+        lock = _user_locks[user_id] = asyncio.Lock()
+    _user_locks.move_to_end(user_id)
+    
+    if len(_user_locks) > USER_LOCK_MAX_ENTRIES:
+        for key in list(_user_locks):
+            if len(_user_locks) <= USER_LOCK_MAX_ENTRIES:
+                break
+            if key != user_id and not _user_locks[key].locked():
+                del _user_locks[key]
+    return lock
 
 
 async def send_private_message(
@@ -145,41 +574,52 @@ async def send_private_message(
     Returns:
         Tuple[bool, str]: (是否成功, 结果描述)
     """
-    try:
-        # 检查冷却时间
-        if config_getter:
-            cooldown_seconds = config_getter("general.cooldown_seconds", 300)
-            if not PrivateChatCooldown.can_send(user_id, cooldown_seconds):
-                remaining = PrivateChatCooldown.get_remaining_time(user_id, cooldown_seconds)
-                return False, f"冷却中，还需等待 {remaining} 秒"
-        
-        # 获取用户的私聊流
-        chat_stream = chat_api.get_stream_by_user_id(user_id, platform)
-        
-        if chat_stream is None:
-            logger.warning(f"未找到用户 {user_id} 的私聊流，可能该用户从未与麦麦私聊过")
-            return False, f"未找到用户 {user_id} 的私聊流"
-        
-        # 发送消息
-        success = await send_api.text_to_stream(
-            text=message,
-            stream_id=chat_stream.stream_id,
-            typing=True,  # 显示正在输入
-            storage_message=True  # 存储消息到数据库
-        )
-        
-        if success:
-            # 记录发送时间
-            PrivateChatCooldown.record_send(user_id)
-            logger.info(f"成功向用户 {user_id} 发送私聊消息")
-            return True, "私聊消息发送成功"
-        else:
-            logger.error(f"向用户 {user_id} 发送私聊消息失败")
-            return False, "消息发送失败"
+    # 同一用户的 冷却检查 -> 发送 -> 记录 串行执行，避免并发重复发送
+    async with _get_user_lock(user_id):
+        try:
+            # 检查冷却时间
+            cooldown_seconds = None
+            if config_getter:
+                cooldown_seconds = get_config_snapshot(config_getter).cooldown_seconds
+                can_send, remaining = PrivateChatCooldown.check_and_remaining(user_id, cooldown_seconds)
+                if not can_send:
+                    return False, f"冷却中，还需等待 {remaining} 秒"
+            
+            # 全局限流
+            if not _GlobalTokenBucket.acquire():
+                logger.warning(f"私聊发送过于频繁，已拒绝向用户 {user_id} 发送")
+                return False, "发送过于频繁，请稍后再试"
+            
+            # 获取用户的私聊流
+            chat_stream = await _get_stream_cached(user_id, platform)
+            
+            if chat_stream is None:
+                logger.warning(f"未找到用户 {user_id} 的私聊流，可能该用户从未与麦麦私聊过")
+                return False, f"未找到用户 {user_id} 的私聊流"
+            
+            # 发送消息
+            success = await send_api.text_to_stream(
+                text=message,
+                stream_id=chat_stream.stream_id,
+                typing=True,  # 显示正在输入
+                storage_message=True  # 存储消息到数据库
+            )
             
-    except Exception as e:
-        logger.error(f"发送私聊消息时出错: {e}")
-        return False, f"发送出错: {str(e)}"
+            if success:
+                # 记录发送时间
+                PrivateChatCooldown.record_send(user_id, cooldown_seconds)
+                logger.info(f"成功向用户 {user_id} 发送私聊消息")
+                return True, "私聊消息发送成功"
+            else:
+                # 私聊流可能已失效，下次重新获取
+                _invalidate_stream_cache(user_id, platform)
+                logger.error(f"向用户 {user_id} 发送私聊消息失败")
+                return False, "消息发送失败"
+            
+        except Exception as e:
+            _invalidate_stream_cache(user_id, platform)
+            logger.error(f"发送私聊消息时出错: {e}")
+            return False, f"发送出错: {str(e)}"
 
 
 # ==================== Action 组件 ====================
@@ -220,19 +660,34 @@ class ProactivePrivateChatAction(BaseAction):
     
     async def execute(self) -> Tuple[bool, str]:
         """执行主动私聊动作"""
+        try:
+            return await self._execute()
+        except Exception as e:
+            logger.error(f"主动私聊执行出错: {e}")
+            return False, f"执行出错: {str(e)}"
+    
+    async def _execute(self) -> Tuple[bool, str]:
+        """主动私聊动作的具体流程"""
+        
+        snap = get_config_snapshot(self.get_config)
         
         # 检查插件是否启用
-        if not self.get_config("general.enabled", True):
+        if not snap.enabled:
             logger.info("主动私聊功能已禁用（通过配置）")
             return False, "主动私聊功能已禁用"
         
+        # 检查平台是否允许，先于任何用户/私聊流查询
+        if self.platform not in snap.allowed_platforms:
+            logger.info(f"平台 {self.platform} 不在允许列表中，跳过私聊")
+            return False, f"平台 {self.platform} 不允许主动私聊"
+        
         # 获取目标用户ID和消息内容
         target_user_id = self.action_data.get("target_user_id", "")
         message_content = self.action_data.get("message_content", "")
         reason = self.action_data.get("reason", "想和你聊聊天")
 
         # 若输入为非数字（用户名），尝试转换为user_id
-        if target_user_id and not target_user_id.isdigit():
+        if target_user_id and not _DIGITS_RE.match(target_user_id):
             logger.debug(f"检测到用户名 {target_user_id}，尝试转换为用户ID")
             converted_user_id = await get_user_id_by_name(self.platform, target_user_id)
             if converted_user_id:
@@ -251,8 +706,7 @@ class ProactivePrivateChatAction(BaseAction):
                 return False, "未指定目标用户"
         
         # 检查是否只允许对已知用户私聊
-        only_known = self.get_config("smart_chat.only_known_users", True)
-        if only_known:
+        if snap.only_known_users:
             # 检查用户是否是已知用户
             is_known = await is_user_known(self.platform, target_user_id)
             if not is_known:
@@ -261,8 +715,8 @@ class ProactivePrivateChatAction(BaseAction):
         
         # 获取用户昵称
         try:
-            person_id = person_api.get_person_id(self.platform, int(target_user_id))
-            nickname = await person_api.get_person_value(person_id, "nickname", "朋友")
+            person_id = _cached_get_person_id(self.platform, target_user_id)
+            nickname = await _cached_get_person_value(person_id, "nickname", "朋友")
         except Exception as e:
             logger.warning(f"获取用户昵称失败: {e}")
             nickname = "朋友"
@@ -272,7 +726,7 @@ class ProactivePrivateChatAction(BaseAction):
             message_content = await get_greeting_message(self.get_config, nickname)
         else:
             # 替换消息中的变量
-            message_content = message_content.replace("{nickname}", nickname)
+            message_content = fill_nickname(message_content, nickname)
         
         # 发送私聊消息
         success, result_msg = await send_private_message(
@@ -301,7 +755,12 @@ class PrivateChatCommand(BaseCommand):
     
     command_name = "private_chat"
     command_description = "向指定用户发送私聊消息"
-    command_pattern = r"^[/／]私聊\s+(?P<target_id>\d+)(?:\s+(?P<message>.+))?$"
+    command_pattern = _PRIVATE_CHAT_RE.pattern
+    
+    @classmethod
+    def get_compiled_pattern(cls) -> re.Pattern:
+        """返回预编译的命令正则"""
+        return _PRIVATE_CHAT_RE
     
     async def execute(self) -> Tuple[bool, Optional[str], bool]:
         """
@@ -310,6 +769,14 @@ class PrivateChatCommand(BaseCommand):
         Returns:
             Tuple[bool, Optional[str], bool]: (是否成功, 回复消息, 是否阻止后续处理)
         """
+        try:
+            return await self._execute()
+        except Exception as e:
+            logger.error(f"执行私聊命令出错: {e}")
+            return False, f"执行出错: {str(e)}", True
+    
+    async def _execute(self) -> Tuple[bool, Optional[str], bool]:
+        """私聊命令的具体流程"""
         # 从匹配组获取参数
         target_user_id = self.matched_groups.get("target_id", "")
         custom_message = self.matched_groups.get("message", None)
@@ -319,14 +786,15 @@ class PrivateChatCommand(BaseCommand):
         
         # 获取用户昵称
         try:
-            person_id = person_api.get_person_id(DEFAULT_PLATFORM, int(target_user_id))
-            nickname = await person_api.get_person_value(person_id, "nickname", "用户")
-        except:
+            person_id = _cached_get_person_id(DEFAULT_PLATFORM, target_user_id)
+            nickname = await _cached_get_person_value(person_id, "nickname", "用户")
+        except Exception as e:
+            logger.debug(f"获取用户昵称失败: {e}")
             nickname = "用户"
         
         # 准备消息内容
         if custom_message:
-            message = custom_message.replace("{nickname}", nickname)
+            message = fill_nickname(custom_message, nickname)
         else:
             message = await get_greeting_message(self.get_config, nickname)
         
@@ -354,31 +822,38 @@ class ListPrivateStreamsCommand(BaseCommand):
     
     command_name = "list_private_streams"
     command_description = "列出所有可用的私聊流"
-    command_pattern = r"^[/／]私聊列表$"
+    command_pattern = _LIST_RE.pattern
+    
+    @classmethod
+    def get_compiled_pattern(cls) -> re.Pattern:
+        """返回预编译的命令正则"""
+        return _LIST_RE
     
     async def execute(self) -> Tuple[bool, Optional[str], bool]:
         """执行列出私聊流命令"""
         
         try:
             # 获取所有私聊流
-            private_streams = chat_api.get_private_streams(DEFAULT_PLATFORM)
+            private_streams = await asyncio.to_thread(chat_api.get_private_streams, DEFAULT_PLATFORM)
             
             if not private_streams:
                 return True, "当前没有可用的私聊流", True
             
-            # 构建回复消息
-            lines = ["📋 可用的私聊流列表：", ""]
-            
-            for i, stream in enumerate(private_streams[:20], 1):  # 最多显示20个
-                stream_info = chat_api.get_stream_info(stream)
-                user_id = stream_info.get("user_id", "未知")
-                user_name = stream_info.get("user_name", "未知用户")
-                lines.append(f"{i}. {user_name} (ID: {user_id})")
+            # 批量获取私聊流信息，最多显示20个
+            shown_streams = private_streams[:20]
+            stream_infos = await _get_stream_infos(shown_streams)
             
-            if len(private_streams) > 20:
-                lines.append(f"... 还有 {len(private_streams) - 20} 个私聊流")
+            # 构建回复消息
+            head = ["📋 可用的私聊流列表：", ""]
+            rows = [
+                (i, info.get("user_name", "未知用户"), info.get("user_id", "未知"))
+                for i, info in enumerate(stream_infos, 1)
+            ]
+            body = [f"{i}. {user_name} (ID: {user_id})" for i, user_name, user_id in rows]
+            hidden = len(private_streams) - len(shown_streams)
+            tail = [f"... 还有 {hidden} 个私聊流"] if hidden > 0 else []
             
-            return True, "\n".join(lines), True
+            return True, "\n".join(head + body + tail), True
             
         except Exception as e:
             logger.error(f"获取私聊流列表失败: {e}")
@@ -387,6 +862,11 @@ class ListPrivateStreamsCommand(BaseCommand):
 
 # ==================== 插件主类 ====================
 
+def _field(type_: str, default: Any, description: str) -> Dict[str, Any]:
+    """构造配置项模式"""
+    return {"type": type_, "default": default, "description": description}
+
+
 @register_plugin
 class ProactivePrivateChatPlugin(BasePlugin):
     """
@@ -402,25 +882,28 @@ class ProactivePrivateChatPlugin(BasePlugin):
     python_dependencies = []
     config_file_name = "config.toml"
     
+    # 缓存预热的后台任务
+    _prewarm_task: Optional[asyncio.Task] = None
+    
     # 配置文件模式
     config_schema = {
         "general": {
-            "enabled": {"type": "bool", "default": True, "description": "是否启用主动私聊功能"},
-            "cooldown_seconds": {"type": "int", "default": 300, "description": "私聊冷却时间（秒）"},
-            "allowed_platforms": {"type": "list", "default": ["qq"], "description": "允许的平台列表"}
+            "enabled": _field("bool", True, "是否启用主动私聊功能"),
+            "cooldown_seconds": _field("int", 300, "私聊冷却时间（秒）"),
+            "allowed_platforms": _field("list", ["qq"], "允许的平台列表")
         },
         "smart_chat": {
-            "trigger_probability": {"type": "float", "default": 0.3, "description": "智能私聊触发概率"},
-            "only_known_users": {"type": "bool", "default": True, "description": "是否只对已知用户私聊"},
-            "min_impression_threshold": {"type": "int", "default": 50, "description": "最小好感度阈值"}
+            "trigger_probability": _field("float", 0.3, "智能私聊触发概率"),
+            "only_known_users": _field("bool", True, "是否只对已知用户私聊"),
+            "min_impression_threshold": _field("int", 50, "最小好感度阈值")
         },
         "messages": {
-            "default_greeting": {"type": "str", "default": "嗨 {nickname}，最近怎么样呀？", "description": "默认问候消息"},
-            "random_greetings": {"type": "list", "default": [], "description": "随机问候消息列表"}
+            "default_greeting": _field("str", "嗨 {nickname}，最近怎么样呀？", "默认问候消息"),
+            "random_greetings": _field("list", [], "随机问候消息列表")
         },
         "command": {
-            "require_admin": {"type": "bool", "default": False, "description": "命令是否需要管理员权限"},
-            "allowed_users": {"type": "list", "default": [], "description": "允许使用命令的用户列表"}
+            "require_admin": _field("bool", False, "命令是否需要管理员权限"),
+            "allowed_users": _field("list", [], "允许使用命令的用户列表")
         }
     }
     
@@ -437,8 +920,21 @@ class ProactivePrivateChatPlugin(BasePlugin):
     
     async def on_load(self):
         """插件加载时的初始化"""
+        invalidate_config_snapshot()
+        if self.get_config("general.enabled", True):
+            # 后台预热缓存，不阻塞插件加载
+            self._prewarm_task = asyncio.create_task(self._prewarm())
         logger.info("主动私聊插件已加载")
     
+    async def _prewarm(self):
+        """预热最近私聊对象的缓存"""
+        try:
+            await prewarm_user_caches(DEFAULT_PLATFORM)
+        except Exception as e:
+            logger.warning(f"预热私聊缓存失败: {e}")
+    
     async def on_unload(self):
         """插件卸载时的清理"""
+        if self._prewarm_task is not None and not self._prewarm_task.done():
+            self._prewarm_task.cancel()
         logger.info("主动私聊插件已卸载")
\ No newline at end of file